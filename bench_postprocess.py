@@ -0,0 +1,74 @@
+# bench_postprocess.py
+# Compare the batch post-processing engine against the old per-article loop.
+# Usage: python bench_postprocess.py [num_articles] [repeats]
+
+import re
+import sys
+import random
+import timeit
+from datetime import datetime
+
+from postprocess import post_process_batch
+
+
+def legacy_post_process_article(article):
+    """The per-article implementation post_process_batch replaced."""
+    processed = {}
+
+    processed["title"] = re.sub(r"\s+", " ", article.get("title", "").strip())
+    processed["description"] = re.sub(r"\s+", " ", article.get("description", "").strip())
+
+    content = re.sub(r"<.*?>", "", article.get("content", ""))
+    processed["content"] = re.sub(r"\s+", " ", content).strip()
+
+    processed["author"] = article.get("author", "").strip()
+
+    source_val = article.get("source", "")
+    if isinstance(source_val, dict):
+        source_val = source_val.get("name", "")
+    processed["source"] = str(source_val).strip()
+
+    pub_date = article.get("publishedAt", "")
+    if pub_date:
+        try:
+            dt = datetime.fromisoformat(pub_date)
+            processed["publishedAt"] = dt.isoformat()
+        except Exception:
+            processed["publishedAt"] = pub_date
+    else:
+        processed["publishedAt"] = ""
+
+    return processed
+
+
+def make_articles(n, seed=0):
+    rng = random.Random(seed)
+    words = ["bitcoin", "market", "price", "  rally", "\n\nETF", "regulators", "<b>crypto</b>", "\tfunds"]
+
+    def text(k):
+        return " ".join(rng.choice(words) for _ in range(k))
+
+    return [
+        {
+            "title": f"  {text(8)}  ",
+            "description": text(30),
+            "content": f"<p>{text(120)}</p> <a href='x'>more</a> [+1234 chars]",
+            "author": f" Author {rng.randint(1, 50)} ",
+            "source": {"id": None, "name": rng.choice(["BBC News", "The Verge", "TechCrunch"])},
+            "publishedAt": f"2025-10-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+        }
+        for _ in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    articles = make_articles(n)
+
+    legacy = min(timeit.repeat(lambda: [legacy_post_process_article(a) for a in articles], number=1, repeat=repeats))
+    batch = min(timeit.repeat(lambda: post_process_batch(articles), number=1, repeat=repeats))
+
+    print(f" Articles: {n}, best of {repeats}")
+    print(f" Per-article loop: {legacy * 1000:8.1f} ms")
+    print(f" Batch engine:     {batch * 1000:8.1f} ms  ({legacy / batch:.2f}x)")
@@ -0,0 +1,228 @@
+# clustering.py
+
+import os
+import math
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from langchain_ollama import OllamaEmbeddings
+
+from postprocess import article_key
+from storage import data_path
+
+EMBED_MODEL = "nomic-embed-text"
+# Relative to the data root, see storage.data_path
+EMBED_CACHE_DIR = "embeddings"
+# Articles are re-delivered for as long as they sit in NewsAPI's 7-day
+# fetch window; two windows of shards are kept, older ones are pruned.
+EMBED_CACHE_DAYS = 14
+
+# Upper bound on clusters, and therefore on summarization calls per run.
+MAX_CLUSTERS = 8
+REPRESENTATIVES_PER_CLUSTER = 3
+
+
+def article_text(article):
+    return " ".join(
+        part for part in (
+            article.get("title") or "",
+            article.get("description") or "",
+            (article.get("content") or "")[:1000],
+        ) if part
+    )
+
+
+def _cache_dir_for(model, cache_dir):
+    return os.path.join(cache_dir, model.replace("/", "_").replace(":", "_"))
+
+
+class EmbeddingCache:
+    """Article embeddings on disk, keyed by article id (see postprocess.article_key).
+
+    The id comes from the NewsAPI url, not from the LLM-cleaned text, which
+    differs each time a re-delivered article is cleaned; a re-delivered
+    article therefore reuses the vector computed on an earlier day. Texts
+    embedded without ids are keyed by a hash of the text.
+
+    Vectors are sharded by the UTC day they were computed on
+    (``<cache_dir>/<model>/YYYY-MM-DD.npz``). A lookup only opens the
+    last ``keep_days`` shards, which is where re-delivered articles from
+    NewsAPI's 7-day fetch window live, and new vectors are appended to
+    today's shard only. Memory and I/O per run therefore stay bounded by
+    recent volume rather than the whole history; older shards are removed
+    by ``prune_embedding_cache``.
+
+    With ``use_cache=False`` every text is sent to the embedder and
+    nothing is read or written on disk, so what the embedder sees does
+    not depend on local cache state (used when recording or replaying).
+    """
+
+    def __init__(self, model=EMBED_MODEL, cache_dir=None, embedder=None,
+                 keep_days=EMBED_CACHE_DAYS, use_cache=True):
+        self.model = model
+        self.embedder = embedder or OllamaEmbeddings(model=model)
+        self.shard_dir = _cache_dir_for(model, cache_dir or data_path(EMBED_CACHE_DIR))
+        self.keep_days = keep_days
+        self.use_cache = use_cache
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _shard_path(self, day):
+        return os.path.join(self.shard_dir, f"{day.isoformat()}.npz")
+
+    def _lookup(self, wanted, today):
+        found = {}
+        remaining = set(wanted)
+        for offset in range(self.keep_days):
+            if not remaining:
+                break
+            path = self._shard_path(today - timedelta(days=offset))
+            if not os.path.exists(path):
+                continue
+            with np.load(path) as shard:
+                keys = shard["keys"]
+                hit = np.isin(keys, list(remaining))
+                if hit.any():
+                    for key, vector in zip(keys[hit], shard["vectors"][hit]):
+                        found[str(key)] = vector
+                        remaining.discard(str(key))
+        return found
+
+    def _append(self, keys, vectors, today):
+        path = self._shard_path(today)
+        if os.path.exists(path):
+            with np.load(path) as shard:
+                keys = np.concatenate([shard["keys"], keys])
+                vectors = np.vstack([shard["vectors"], vectors])
+        os.makedirs(self.shard_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=keys, vectors=vectors)
+        os.replace(tmp_path, path)
+
+    def embed(self, texts, keys=None, today=None):
+        today = today or datetime.now(timezone.utc).date()
+        keys = list(keys) if keys is not None else [self._key(t) for t in texts]
+        unique = dict(zip(keys, texts))
+        found = self._lookup(unique, today) if self.use_cache else {}
+        hits = sum(1 for k in keys if k in found)
+
+        missing = [(k, t) for k, t in unique.items() if k not in found]
+        if missing:
+            new_vectors = np.asarray(
+                self.embedder.embed_documents([t for _, t in missing]), dtype=np.float32
+            )
+            new_keys = np.array([k for k, _ in missing])
+            if self.use_cache:
+                self._append(new_keys, new_vectors, today)
+            found.update(zip(new_keys.tolist(), new_vectors))
+        print(f" Embedded {len(missing)} new text(s), {hits} of {len(texts)} article(s) served from cache")
+        return np.stack([found[k] for k in keys])
+
+
+def prune_embedding_cache(model=EMBED_MODEL, cache_dir=None, keep_days=EMBED_CACHE_DAYS, today=None):
+    """Delete embedding shards that EmbeddingCache no longer reads."""
+    cache_dir = cache_dir or data_path(EMBED_CACHE_DIR)
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = (today - timedelta(days=keep_days - 1)).isoformat()
+    shard_dir = _cache_dir_for(model, cache_dir)
+    pruned = 0
+    if os.path.isdir(shard_dir):
+        for name in os.listdir(shard_dir):
+            if name.endswith(".npz") and name[:-len(".npz")] < cutoff:
+                os.remove(os.path.join(shard_dir, name))
+                pruned += 1
+    print(f" Pruned {pruned} embedding shard(s) older than {cutoff}")
+    return pruned
+
+
+def normalize_rows(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def minibatch_kmeans(X, k, batch_size=256, max_iter=100, tol=1e-4, n_init=3, seed=0):
+    """Spherical mini-batch k-means on L2-normalized rows.
+
+    Similarity is the dot product (cosine on unit vectors). Centroids are
+    running means of the points assigned to them, renormalized after each
+    batch. The best of ``n_init`` seedings by total similarity is kept.
+    Returns (labels, centers).
+    """
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(n_init):
+        centers = _minibatch_kmeans_once(X, k, rng, batch_size, max_iter, tol)
+        sims = X @ centers.T
+        score = sims.max(axis=1).sum()
+        if best is None or score > best[0]:
+            best = (score, np.argmax(sims, axis=1), centers)
+    return best[1], best[2]
+
+
+def _minibatch_kmeans_once(X, k, rng, batch_size, max_iter, tol):
+    n = X.shape[0]
+
+    # k-means++ seeding with cosine distance
+    centers = np.empty((k, X.shape[1]), dtype=X.dtype)
+    centers[0] = X[rng.integers(n)]
+    dist = np.clip(1.0 - X @ centers[0], 0.0, None)
+    for i in range(1, k):
+        total = dist.sum()
+        probs = dist / total if total > 0 else np.full(n, 1.0 / n)
+        centers[i] = X[rng.choice(n, p=probs)]
+        dist = np.minimum(dist, np.clip(1.0 - X @ centers[i], 0.0, None))
+
+    counts = np.zeros(k)
+    for _ in range(max_iter):
+        batch = X[rng.choice(n, size=min(batch_size, n), replace=False)]
+        labels = np.argmax(batch @ centers.T, axis=1)
+        batch_counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, batch)
+
+        hit = batch_counts > 0
+        new_counts = counts + batch_counts
+        updated = centers.copy()
+        updated[hit] = (centers[hit] * counts[hit, None] + sums[hit]) / new_counts[hit, None]
+        updated = normalize_rows(updated)
+
+        shift = np.max(np.linalg.norm(updated - centers, axis=1))
+        centers, counts = updated, new_counts
+        if shift < tol:
+            break
+
+    return centers
+
+
+def cluster_articles(articles, cache=None, max_clusters=MAX_CLUSTERS,
+                     n_representatives=REPRESENTATIVES_PER_CLUSTER):
+    """Group articles by topic.
+
+    Returns clusters sorted by size, each a dict with ``size`` and the
+    ``representatives`` closest to the cluster centroid.
+    """
+    if not articles:
+        return []
+    cache = cache or EmbeddingCache()
+    X = normalize_rows(cache.embed([article_text(a) for a in articles], [article_key(a) for a in articles]))
+
+    k = min(max_clusters, max(1, math.ceil(math.sqrt(len(articles)))))
+    labels, centers = minibatch_kmeans(X, k)
+
+    clusters = []
+    for c in range(k):
+        members = np.flatnonzero(labels == c)
+        if members.size == 0:
+            continue
+        closest = members[np.argsort(-(X[members] @ centers[c]))[:n_representatives]]
+        clusters.append({
+            "size": int(members.size),
+            "representatives": [articles[i] for i in closest],
+        })
+    clusters.sort(key=lambda cl: cl["size"], reverse=True)
+    return clusters
@@ -3,23 +3,42 @@
 import os
 import json
 import time
-import re
 import schedule
-from datetime import date, datetime, timedelta
-from collections import Counter
+from datetime import date, timedelta
 from newsapi import NewsApiClient
-from langchain_ollama import ChatOllama
+from langchain_ollama import ChatOllama, OllamaEmbeddings
 import dotenv
+from stats_store import StatsStore, update_stats_store, format_rolling_stats
+from postprocess import post_process_batch
+from search_index import index_cleaned_file, relocate_files, drop_files
+from clustering import (
+    EmbeddingCache, EMBED_MODEL, cluster_articles, article_text, prune_embedding_cache
+)
+from replay import MESSAGE_CODEC, JSON_CODEC, session_from_env
+from profiling import RunProfiler
+from storage import (
+    RAW_RETENTION_DAYS, CLEANED_RETENTION_DAYS, partition_dir, write_partitioned, get_latest_file,
+    compact_partitions, apply_retention, data_path, set_data_dir,
+)
+
+# Record/replay of NewsAPI and Ollama calls, configured via PIPELINE_IO_* env vars
+io_session = session_from_env()
+if io_session.data_dir:
+    # Keep a replayed run away from the live data/ tree
+    set_data_dir(io_session.data_dir)
 
 
 
 def fetch_and_save_raw_news():
     dotenv.load_dotenv()
     news_api_key = os.getenv("news_api_key")
-    if not news_api_key:
+    if not news_api_key and io_session.mode != "replay":
         raise ValueError("news_api_key not found. Check your .env file.")
 
-    newsapi = NewsApiClient(api_key=news_api_key)
+    newsapi = io_session.wrap(
+        lambda: NewsApiClient(api_key=news_api_key), "newsapi",
+        {"get_top_headlines": JSON_CODEC, "get_everything": JSON_CODEC},
+    )
 
     # Fetch top headlines
     newsapi.get_top_headlines(
@@ -47,16 +66,11 @@ def fetch_and_save_raw_news():
     articles = all_articles.get('articles', [])
     print(f" Fetched {len(articles)} articles")
 
-    os.makedirs("data", exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join("data", f"raw_news_{timestamp}.json")
-
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(all_articles, f, indent=2, ensure_ascii=False)
+    filename = write_partitioned("raw", "raw_news", all_articles)
     print(f" Raw data saved to: {filename}")
 
     # Append to log
-    log_file = os.path.join("data", "raw_news_log.json")
+    log_file = data_path("raw_news_log.json")
     if os.path.exists(log_file):
         with open(log_file, "r", encoding="utf-8") as f:
             existing_data = json.load(f)
@@ -70,7 +84,13 @@ def fetch_and_save_raw_news():
 
 
 
-def get_latest_raw_file(directory="data"):
+def get_latest_raw_file(directory=None):
+    latest = get_latest_file("raw")
+    if latest:
+        return latest
+
+    directory = directory or data_path()
+    # Fall back to the legacy flat layout for files written before partitioning
     json_files = [f for f in os.listdir(directory) if f.endswith(".json") and f.startswith("raw_news")]
     if not json_files:
         return None
@@ -78,7 +98,10 @@ def get_latest_raw_file(directory="data"):
     return os.path.join(directory, json_files[0])
 
 # Initialize LLM
-llm = ChatOllama(model="mistral")
+llm = io_session.wrap(lambda: ChatOllama(model="mistral"), "ollama.chat", {"invoke": MESSAGE_CODEC})
+embedder = io_session.wrap(
+    lambda: OllamaEmbeddings(model=EMBED_MODEL), "ollama.embed", {"embed_documents": JSON_CODEC}
+)
 
 def clean_data_ai(text: str) -> str:
     if not text:
@@ -98,34 +121,6 @@ def clean_data_ai(text: str) -> str:
     response = llm.invoke(prompt)
     return response.content.strip()
 
-def post_process_article(article: dict) -> dict:
-    processed = {}
-
-    processed["title"] = re.sub(r"\s+", " ", article.get("title", "").strip())
-    processed["description"] = re.sub(r"\s+", " ", article.get("description", "").strip())
-
-    content = re.sub(r"<.*?>", "", article.get("content", ""))
-    processed["content"] = re.sub(r"\s+", " ", content).strip()
-
-    processed["author"] = article.get("author", "").strip()
-
-    source_val = article.get("source", "")
-    if isinstance(source_val, dict):
-        source_val = source_val.get("name", "")
-    processed["source"] = str(source_val).strip()
-
-    pub_date = article.get("publishedAt", "")
-    if pub_date:
-        try:
-            dt = datetime.fromisoformat(pub_date)
-            processed["publishedAt"] = dt.isoformat()
-        except Exception:
-            processed["publishedAt"] = pub_date
-    else:
-        processed["publishedAt"] = ""
-
-    return processed
-
 def remove_duplicates(articles):
     seen_titles, seen_contents = set(), set()
     unique = []
@@ -152,54 +147,64 @@ def run_cleaning_pipeline():
     # Some raw files have `{"articles": [...]}`
     articles = raw_data.get("articles", raw_data)
 
-    cleaned_articles = []
+    ai_cleaned_articles = []
     for art in articles:
-        ai_cleaned = {
+        ai_cleaned_articles.append({
             "title": clean_data_ai(art.get("title", "")),
             "description": clean_data_ai(art.get("description", "")),
             "content": clean_data_ai(art.get("content", "")),
             "author": art.get("author", ""),
             "source": art.get("source", ""),
             "publishedAt": art.get("publishedAt", ""),
-        }
-        fully = post_process_article(ai_cleaned)
-        cleaned_articles.append(fully)
+            # Identifies the article across runs; the LLM-cleaned text does not
+            "url": art.get("url", ""),
+        })
 
-    cleaned_articles = remove_duplicates(cleaned_articles)
+    cleaned_articles = remove_duplicates(post_process_batch(ai_cleaned_articles))
 
-    os.makedirs("data/cleaned", exist_ok=True)
-    out_file = f"data/cleaned/news_cleaned_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(out_file, "w", encoding="utf-8") as f:
-        json.dump(cleaned_articles, f, indent=2, ensure_ascii=False)
+    out_file = write_partitioned("cleaned", "news_cleaned", cleaned_articles)
     print(f" Cleaned data saved to: {out_file}")
+
+    update_stats_store(cleaned_articles)
+    index_cleaned_file(out_file)
     return out_file
 
 
 
+def summarize_cluster(cluster):
+    text = "\n\n".join(article_text(a) for a in cluster["representatives"])[:4000]
+    prompt = (
+        f"The following articles are representative of a topic covered by "
+        f"{cluster['size']} news article(s). Summarize the topic in 2-3 sentences:\n\n{text}"
+    )
+    return llm.invoke(prompt).content.strip()
+
+
 def summarize_cleaned_file(file_path):
     with open(file_path, "r", encoding="utf-8") as f:
         articles = json.load(f)
 
-    text = " ".join(
-        (a.get("title") or "") + " " +
-        (a.get("description") or "") + " " +
-        (a.get("content") or "")
-        for a in articles
-    )[:4000]
+    # One LLM call per topic cluster, bounded by clustering.MAX_CLUSTERS
+    # The on-disk cache would make recorded embedding calls depend on local state
+    cache = EmbeddingCache(embedder=embedder, use_cache=io_session.mode == "off")
+    clusters = cluster_articles(articles, cache)
 
     num_articles = len(articles)
-    sources = [a.get("source") for a in articles if a.get("source")]
-    authors = [a.get("author") for a in articles if a.get("author")]
+    store = StatsStore()
+    if not store.hours:
+        # Summarizing a file that never went through run_cleaning_pipeline
+        store.update(articles)
 
     stats = f"""
 Number of articles: {num_articles}
-Top Sources: {Counter(sources).most_common(5)}
-Top Authors: {Counter(authors).most_common(5)}
+Topic clusters: {len(clusters)}
+{format_rolling_stats(store)}
 """
 
-    prompt = f"Summarize the following news dataset in 1-2 paragraphs:\n\n{text}"
-    resp = llm.invoke(prompt)
-    summary = resp.content.strip()
+    summary = "\n\n".join(
+        f"Topic {i} ({cluster['size']} article(s)): {summarize_cluster(cluster)}"
+        for i, cluster in enumerate(clusters, 1)
+    )
 
     print("===== SUMMARY =====")
     print(stats)
@@ -215,10 +220,29 @@ Top Authors: {Counter(authors).most_common(5)}
 
 def scheduled_pipeline():
     print("\n Running scheduled full pipeline...")
-    fetch_and_save_raw_news()
-    cleaned_file = run_cleaning_pipeline()
-    if cleaned_file:
-        summarize_cleaned_file(cleaned_file)
+    # Opt-in via PIPELINE_PROFILE=<fraction of runs to profile>
+    profiler = RunProfiler.from_env()
+    cleaned_file = None
+
+    try:
+        with profiler.stage("fetch"):
+            fetch_and_save_raw_news()
+        with profiler.stage("clean"):
+            cleaned_file = run_cleaning_pipeline()
+        if cleaned_file:
+            with profiler.stage("summarize"):
+                summarize_cleaned_file(cleaned_file)
+
+        with profiler.stage("maintenance"):
+            compact_partitions("raw")
+            apply_retention("raw", RAW_RETENTION_DAYS)
+            compact_partitions("cleaned", on_merge=relocate_files)
+            apply_retention("cleaned", CLEANED_RETENTION_DAYS, on_remove=drop_files)
+            prune_embedding_cache()
+    finally:
+        # Failed runs are the ones most worth diagnosing, so report them too
+        output_dir = os.path.dirname(cleaned_file) if cleaned_file else partition_dir("cleaned", date.today())
+        profiler.write_report(output_dir)
 
 
 
@@ -226,6 +250,10 @@ if __name__ == "__main__":
     # Run immediately
     scheduled_pipeline()
 
+    if io_session.mode == "replay":
+        # A replayed run is a one-off for profiling/regression, not a daemon
+        raise SystemExit(0)
+
     # Schedule daily at 09:00
     schedule.every().day.at("09:00").do(scheduled_pipeline)
     print(" Scheduler started. Pipeline will run daily at 09:00.")
@@ -0,0 +1,104 @@
+# postprocess.py
+
+import re
+import hashlib
+from datetime import datetime, timezone
+
+# Equivalent to the old r"<.*?>" (a tag never spans a newline) but written
+# without a lazy quantifier, and never crossing the sentinel so a stray "<"
+# cannot swallow the start of the next value.
+HTML_TAG_RE = re.compile(r"<[^>\n\x00]*>")
+
+# Joins a whole column into one string so the tag pattern runs once per batch
+SENTINEL = "\x00"
+
+FIELDS = ("title", "description", "content", "author", "source", "publishedAt", "url")
+
+
+def article_key(article):
+    """Stable identity of an article, raw or cleaned.
+
+    Keyed on the NewsAPI ``url``: the LLM cleaning step is not deterministic,
+    so an article re-delivered on a later day usually comes back with
+    different cleaned text. Articles without a url fall back to their
+    normalized title and content.
+    """
+    url = (article.get("url") or "").strip()
+    if url:
+        payload = url
+    else:
+        title = (article.get("title") or "").strip().lower()
+        content = (article.get("content") or "").strip().lower()
+        payload = f"{title}\x00{content}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _as_text(value):
+    if isinstance(value, dict):
+        value = value.get("name", "")
+    return "" if value is None else str(value)
+
+
+def normalize_text_column(values, strip_html=False):
+    r"""Collapse whitespace (and optionally drop HTML tags) for a list of strings.
+
+    ``" ".join(v.split())`` gives the same result as ``re.sub(r"\s+", " ", v).strip()``
+    (both use str.isspace) without a regex match per word.
+    """
+    if strip_html and values:
+        joined = SENTINEL.join(values)
+        if joined.count(SENTINEL) == len(values) - 1:
+            values = HTML_TAG_RE.sub("", joined).split(SENTINEL)
+        else:
+            # A value contains the sentinel itself; strip tags value by value
+            values = [HTML_TAG_RE.sub("", v) for v in values]
+    return [" ".join(v.split()) for v in values]
+
+
+def normalize_timestamp(value):
+    """Parse an ISO 8601 timestamp and return it as UTC ISO, e.g. 2025-10-15T12:00:00+00:00.
+
+    Accepts NewsAPI's trailing ``Z`` on every Python version and treats
+    naive timestamps as UTC. Unparseable values are returned unchanged.
+    """
+    if not value:
+        return ""
+    text = value.strip()
+    if text[-1:] in ("Z", "z"):
+        text = text[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        return value
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc).isoformat()
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def normalize_timestamp_column(values):
+    cache = {}
+    out = []
+    for v in values:
+        if v not in cache:
+            cache[v] = normalize_timestamp(v)
+        out.append(cache[v])
+    return out
+
+
+def post_process_batch(articles):
+    """Programmatically clean fields for a whole batch of articles at once."""
+    columns = {field: [_as_text(a.get(field)) for a in articles] for field in FIELDS}
+
+    columns["title"] = normalize_text_column(columns["title"])
+    columns["description"] = normalize_text_column(columns["description"])
+    columns["content"] = normalize_text_column(columns["content"], strip_html=True)
+    columns["author"] = [v.strip() for v in columns["author"]]
+    columns["source"] = [v.strip() for v in columns["source"]]
+    columns["url"] = [v.strip() for v in columns["url"]]
+    columns["publishedAt"] = normalize_timestamp_column(columns["publishedAt"])
+
+    return [dict(zip(FIELDS, row)) for row in zip(*(columns[f] for f in FIELDS))]
+
+
+def post_process_article(article):
+    return post_process_batch([article])[0]
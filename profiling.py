@@ -0,0 +1,220 @@
+# profiling.py
+
+import os
+import time
+import random
+import signal
+import threading
+import cProfile
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from collections import Counter
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# PIPELINE_PROFILE is the fraction of runs to profile: 0 (off), 1 (every run), 0.05, ...
+PROFILE_RATE_ENV = "PIPELINE_PROFILE"
+# PIPELINE_PROFILE_CPU=sampling|cprofile; sampling needs setitimer (not on Windows)
+PROFILE_CPU_ENV = "PIPELINE_PROFILE_CPU"
+# PIPELINE_PROFILE_TRACEMALLOC=0 skips allocation tracing, which costs far more
+# than sampling on allocation-heavy stages; RSS and CPU profiles are still taken.
+PROFILE_TRACEMALLOC_ENV = "PIPELINE_PROFILE_TRACEMALLOC"
+SAMPLE_INTERVAL = 0.005
+TOP_ALLOCATORS = 10
+TOP_FUNCTIONS = 15
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux only). Returns True on success."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak // 1024 if os.uname().sysname == "Darwin" else peak
+
+
+class StackSampler:
+    """Statistical CPU profiler: records the main thread's stack on every SIGPROF.
+
+    Overhead is one signal per ``interval`` seconds of CPU time, so unlike
+    cProfile it does not slow down tight Python loops.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._previous_handler = None
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def disable(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def write(self, f, stacks_file):
+        total = sum(self.stacks.values())
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                cumulative[name] += count
+
+        f.write(f"{total} CPU samples every {self.interval * 1000:.0f} ms\n")
+        f.write(f"Top {TOP_FUNCTIONS} functions by cumulative samples:\n")
+        for name, count in cumulative.most_common(TOP_FUNCTIONS):
+            f.write(f"  {count / total:6.1%} cum  {own[name] / total:6.1%} own  {name}\n")
+
+        # Collapsed stacks, loadable by flamegraph.pl / speedscope
+        with open(stacks_file, "w", encoding="utf-8") as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f"{stack} {count}\n")
+
+
+class RunProfiler:
+    """Per-stage memory and CPU profiling for one pipeline run.
+
+    When disabled, ``stage()`` does nothing. When enabled, each stage gets
+    a CPU profile (sampled stacks, or a full cProfile), the peak RSS and,
+    unless ``trace_memory`` is off, the tracemalloc peak and the top
+    allocators still alive at the end of the stage. Tracing is only
+    switched on while a stage runs.
+    """
+
+    def __init__(self, enabled=False, cpu_mode="sampling", trace_memory=True, tracemalloc_frames=1):
+        if cpu_mode not in ("sampling", "cprofile"):
+            raise ValueError(f"Unknown CPU profiling mode: {cpu_mode}")
+        if cpu_mode == "sampling" and not hasattr(signal, "setitimer"):
+            cpu_mode = "cprofile"
+        self.enabled = enabled
+        self.cpu_mode = cpu_mode
+        self.trace_memory = trace_memory
+        self.tracemalloc_frames = tracemalloc_frames
+        self.stages = []
+
+    @classmethod
+    def from_env(cls):
+        try:
+            rate = float(os.getenv(PROFILE_RATE_ENV, "0"))
+        except ValueError:
+            rate = 0.0
+        return cls(
+            enabled=rate > 0 and random.random() < rate,
+            cpu_mode=os.getenv(PROFILE_CPU_ENV, "sampling"),
+            trace_memory=os.getenv(PROFILE_TRACEMALLOC_ENV, "1") != "0",
+        )
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        rss_reset = _reset_peak_rss()
+        if self.trace_memory:
+            tracemalloc.start(self.tracemalloc_frames)
+        # Signal handlers can only be installed from the main thread
+        if self.cpu_mode == "sampling" and threading.current_thread() is threading.main_thread():
+            profile = StackSampler()
+        else:
+            profile = cProfile.Profile()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        error = None
+        profile.enable()
+        try:
+            yield
+        except BaseException as exc:
+            error = repr(exc)
+            raise
+        finally:
+            profile.disable()
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            top_allocators, traced_peak = [], None
+            if self.trace_memory:
+                # Leave out the profiler's own bookkeeping
+                snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+                top_allocators = snapshot.statistics("lineno")[:TOP_ALLOCATORS]
+                _, traced_peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            self.stages.append({
+                "name": name,
+                "error": error,
+                "wall": wall,
+                "cpu": cpu,
+                "peak_rss_kb": _peak_rss_kb(),
+                # Without a reset the high-water mark covers the whole process so far
+                "rss_is_stage_peak": rss_reset,
+                "traced_peak": traced_peak,
+                "top_allocators": top_allocators,
+                "profile": profile,
+            })
+
+    def write_report(self, output_dir):
+        """Write profile_report.txt plus one .stacks or .prof file per stage.
+
+        Everything goes into output_dir/profile_<timestamp>/.
+        """
+        if not self.enabled or not self.stages:
+            return None
+        report_dir = os.path.join(output_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(report_dir, exist_ok=True)
+
+        report_file = os.path.join(report_dir, "profile_report.txt")
+        with open(report_file, "w", encoding="utf-8") as f:
+            for s in self.stages:
+                rss = "n/a" if s["peak_rss_kb"] is None else f"{s['peak_rss_kb'] / 1024:.1f} MiB"
+                if s["peak_rss_kb"] is not None and not s["rss_is_stage_peak"]:
+                    rss += " (process peak)"
+                f.write(f"===== STAGE: {s['name']} =====\n")
+                if s["error"]:
+                    f.write(f"Failed with: {s['error']}\n")
+                f.write(f"Wall time: {s['wall']:.3f} s\n")
+                f.write(f"CPU time: {s['cpu']:.3f} s\n")
+                f.write(f"Peak RSS: {rss}\n")
+                if s["traced_peak"] is not None:
+                    f.write(f"Peak traced Python memory: {s['traced_peak'] / 1024 / 1024:.1f} MiB\n")
+                    f.write("Top allocators still alive at end of stage:\n")
+                    for stat in s["top_allocators"]:
+                        f.write(f"  {stat}\n")
+                if isinstance(s["profile"], StackSampler):
+                    s["profile"].write(f, os.path.join(report_dir, f"{s['name']}.stacks"))
+                else:
+                    f.write(f"Top {TOP_FUNCTIONS} functions by cumulative time:\n")
+                    stats = pstats.Stats(s["profile"], stream=f)
+                    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+                    stats.dump_stats(os.path.join(report_dir, f"{s['name']}.prof"))
+                f.write("\n")
+
+        print(f" Profile report saved to: {report_file}")
+        return report_file
@@ -0,0 +1,198 @@
+# replay.py
+
+import os
+import json
+import tempfile
+import gzip
+import zlib
+import time
+import atexit
+import hashlib
+from types import SimpleNamespace
+from collections import defaultdict, deque
+
+# PIPELINE_IO_MODE=off|record|replay, PIPELINE_IO_LATENCY=recorded|zero
+IO_MODE_ENV = "PIPELINE_IO_MODE"
+IO_ARCHIVE_ENV = "PIPELINE_IO_ARCHIVE"
+IO_LATENCY_ENV = "PIPELINE_IO_LATENCY"
+# Data root for a replayed run; a fresh temp dir when unset, never the live data/
+IO_REPLAY_DATA_ENV = "PIPELINE_REPLAY_DATA_DIR"
+DEFAULT_ARCHIVE = os.path.join("data", "replay", "io_archive.jsonl.gz")
+
+# Arguments that change from day to day (the NewsAPI date window) and must
+# not prevent a recording from matching a later replay.
+VOLATILE_ARGS = {"from_param", "to"}
+
+
+def _identity(value):
+    return value
+
+
+# Encoders/decoders for results that are not plain JSON
+MESSAGE_CODEC = (lambda msg: {"content": msg.content}, lambda data: SimpleNamespace(**data))
+JSON_CODEC = (_identity, _identity)
+
+
+def _read_entries(path):
+    """Return (entries, complete); complete is False when the archive ends in a cut-off stream."""
+    entries = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    return entries, False
+    except (EOFError, zlib.error, gzip.BadGzipFile):
+        return entries, False
+    return entries, True
+
+
+def read_archive(path):
+    """Load archive entries, stopping at a record cut short by a killed recorder."""
+    entries, complete = _read_entries(path)
+    if not complete:
+        print(f" IO archive {path} ends in a truncated record; using the {len(entries)} complete one(s)")
+    return entries
+
+
+def _repair_archive(path):
+    """Rewrite an archive left unterminated by a killed recorder.
+
+    A gzip stream appended after a cut-off one cannot be read, so the
+    complete entries are written back as one closed stream first.
+    """
+    if not os.path.exists(path):
+        return
+    entries, complete = _read_entries(path)
+    if complete:
+        return
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+    os.replace(tmp_path, path)
+    print(f" Repaired IO archive {path}: kept {len(entries)} complete record(s)")
+
+
+class IOSession:
+    """Records external calls to, or replays them from, a gzipped JSON-lines archive.
+
+    Each entry holds the call kind, its arguments, the result and the
+    observed latency. Each recording session appends one gzip stream to
+    the archive, so the long prompt repeated in every LLM call compresses
+    against earlier entries. The stream is flushed (a zlib sync flush)
+    after every entry, so the archive is readable up to the last complete
+    record if the recorder is killed. Replay matches calls on kind and
+    arguments; repeated identical calls are served in the order they were
+    recorded.
+    """
+
+    def __init__(self, mode="off", archive_path=DEFAULT_ARCHIVE, latency="recorded", data_dir=None):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown IO mode: {mode}")
+        if latency not in ("recorded", "zero"):
+            raise ValueError(f"Unknown replay latency: {latency}")
+        self.mode = mode
+        self.archive_path = archive_path
+        self.latency = latency
+        # Where a replayed run should write its outputs; None outside replay
+        self.data_dir = None
+        self._out = None
+        self._entries = defaultdict(deque)
+
+        if mode == "record":
+            os.makedirs(os.path.dirname(archive_path) or ".", exist_ok=True)
+            _repair_archive(archive_path)
+            self._out = gzip.open(archive_path, "ab")
+            atexit.register(self.close)
+        elif mode == "replay":
+            if not os.path.exists(archive_path):
+                raise FileNotFoundError(f"No IO archive to replay at {archive_path}")
+            for entry in read_archive(archive_path):
+                self._entries[entry["key"]].append(entry)
+            self.data_dir = data_dir or tempfile.mkdtemp(prefix="pipeline_replay_")
+            print(
+                f" Replaying {sum(map(len, self._entries.values()))} recorded call(s) from {archive_path}"
+                f", writing outputs under {self.data_dir}"
+            )
+
+    @staticmethod
+    def _key(kind, args, kwargs):
+        stable = {k: v for k, v in kwargs.items() if k not in VOLATILE_ARGS}
+        payload = json.dumps([kind, args, stable], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def call(self, kind, fn, args, kwargs, codec=JSON_CODEC):
+        encode, decode = codec
+        if self.mode == "off":
+            return fn(*args, **kwargs)
+
+        key = self._key(kind, args, kwargs)
+        if self.mode == "replay":
+            queue = self._entries.get(key)
+            if not queue:
+                raise LookupError(f"No recorded response for {kind} call (key {key[:12]})")
+            entry = queue.popleft()
+            if self.latency == "recorded":
+                time.sleep(entry["latency"])
+            return decode(entry["response"])
+
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        latency = time.perf_counter() - start
+        entry = {
+            "key": key, "kind": kind, "args": args, "kwargs": kwargs,
+            "response": encode(result), "latency": round(latency, 6),
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        self._out.write(line.encode("utf-8"))
+        self._out.flush()
+        return result
+
+    def wrap(self, factory, kind, methods):
+        """Wrap the object built by ``factory``; ``methods`` maps method names to codecs.
+
+        In replay mode the factory is never called, so no API key or running
+        server is needed.
+        """
+        return _RecordReplayProxy(self, factory, kind, methods)
+
+    def close(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+
+class _RecordReplayProxy:
+    def __init__(self, session, factory, kind, methods):
+        self._session = session
+        self._factory = factory
+        self._kind = kind
+        self._methods = methods
+        self._target = None
+
+    def _get_target(self):
+        if self._target is None:
+            self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name):
+        if name not in self._methods:
+            return getattr(self._get_target(), name)
+
+        def method(*args, **kwargs):
+            fn = None if self._session.mode == "replay" else getattr(self._get_target(), name)
+            return self._session.call(
+                f"{self._kind}.{name}", fn, list(args), kwargs, self._methods[name]
+            )
+        return method
+
+
+def session_from_env():
+    return IOSession(
+        mode=os.getenv(IO_MODE_ENV, "off"),
+        archive_path=os.getenv(IO_ARCHIVE_ENV, DEFAULT_ARCHIVE),
+        latency=os.getenv(IO_LATENCY_ENV, "recorded"),
+        data_dir=os.getenv(IO_REPLAY_DATA_ENV),
+    )
@@ -0,0 +1,233 @@
+# search_index.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+
+from postprocess import article_key
+from storage import data_path, load_manifest
+
+# Relative to the data root, see storage.data_path
+INDEX_FILE = os.path.join("search", "index.sqlite3")
+
+# bm25() column weights, in the column order of articles_fts
+FIELD_WEIGHTS = {"title": 3.0, "description": 1.5, "content": 1.0}
+
+QUERY_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT UNIQUE NOT NULL,
+    title TEXT,
+    description TEXT,
+    content TEXT,
+    author TEXT,
+    source TEXT,
+    publishedAt TEXT,
+    url TEXT,
+    file TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_articles_source ON articles(source);
+CREATE INDEX IF NOT EXISTS idx_articles_author ON articles(author);
+CREATE INDEX IF NOT EXISTS idx_articles_published ON articles(publishedAt);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, description, content,
+    content='articles', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS indexed_files (path TEXT PRIMARY KEY, indexed_at TEXT);
+"""
+
+
+def connect(path=None):
+    path = path or data_path(INDEX_FILE)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def index_cleaned_file(file_path, conn=None):
+    """Add one news_cleaned_*.json file to the index. Already indexed files are skipped."""
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        if conn.execute("SELECT 1 FROM indexed_files WHERE path = ?", (file_path,)).fetchone():
+            return 0
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            articles = json.load(f)
+
+        added = 0
+        with conn:
+            for a in articles:
+                key = article_key(a)
+                if conn.execute("SELECT 1 FROM articles WHERE doc_key = ?", (key,)).fetchone():
+                    # Re-delivered article: point it at the newest file that holds it,
+                    # so pruning the file it was first indexed from does not drop it
+                    conn.execute("UPDATE articles SET file = ? WHERE doc_key = ?", (file_path, key))
+                    continue
+                cur = conn.execute(
+                    "INSERT INTO articles "
+                    "(doc_key, title, description, content, author, source, publishedAt, url, file) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key, a.get("title", ""), a.get("description", ""),
+                        a.get("content", ""), a.get("author", ""), a.get("source", ""),
+                        a.get("publishedAt", ""), a.get("url", ""), file_path,
+                    ),
+                )
+                conn.execute(
+                    "INSERT INTO articles_fts (rowid, title, description, content) VALUES (?, ?, ?, ?)",
+                    (cur.lastrowid, a.get("title", ""), a.get("description", ""), a.get("content", "")),
+                )
+                added += 1
+            conn.execute(
+                "INSERT INTO indexed_files (path, indexed_at) VALUES (?, datetime('now'))", (file_path,)
+            )
+        print(f" Indexed {added} new article(s) from {file_path}")
+        return added
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def relocate_files(old_paths, new_path, conn=None):
+    """Point index rows at the segment that compaction merged old_paths into."""
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        placeholders = ", ".join("?" * len(old_paths))
+        with conn:
+            conn.execute(
+                f"UPDATE articles SET file = ? WHERE file IN ({placeholders})", [new_path, *old_paths]
+            )
+            conn.execute(f"DELETE FROM indexed_files WHERE path IN ({placeholders})", old_paths)
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_files (path, indexed_at) VALUES (?, datetime('now'))",
+                (new_path,),
+            )
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def drop_files(paths, conn=None):
+    """Remove every article indexed from paths, e.g. files deleted by retention."""
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        placeholders = ", ".join("?" * len(paths))
+        with conn:
+            rows = conn.execute(
+                f"SELECT id, title, description, content FROM articles WHERE file IN ({placeholders})", paths
+            ).fetchall()
+            # External-content FTS5 tables need the old values to delete a row
+            conn.executemany(
+                "INSERT INTO articles_fts (articles_fts, rowid, title, description, content) "
+                "VALUES ('delete', ?, ?, ?, ?)",
+                [tuple(r) for r in rows],
+            )
+            conn.execute(f"DELETE FROM articles WHERE file IN ({placeholders})", paths)
+            conn.execute(f"DELETE FROM indexed_files WHERE path IN ({placeholders})", paths)
+        print(f" Dropped {len(rows)} article(s) of {len(paths)} removed file(s) from the search index")
+        return len(rows)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def index_all_cleaned():
+    """Backfill the index from every cleaned file registered in the manifest."""
+    conn = connect()
+    try:
+        partitions = load_manifest("cleaned")["partitions"]
+        return sum(
+            index_cleaned_file(path, conn)
+            for day in sorted(partitions)
+            for path in partitions[day]
+            if os.path.exists(path)
+        )
+    finally:
+        conn.close()
+
+
+def _match_expression(query):
+    # Quote every token so user input can never be parsed as FTS5 syntax;
+    # OR lets BM25 rank partial matches instead of requiring every term.
+    tokens = QUERY_TOKEN_RE.findall(query)
+    return " OR ".join(f'"{t}"' for t in tokens)
+
+
+def search(query, source=None, author=None, since=None, until=None, limit=10, conn=None):
+    """BM25-ranked search with title/description/content boosts.
+
+    ``since`` and ``until`` are ISO dates or timestamps compared against
+    publishedAt; ``until`` is inclusive of the whole day when given as a date.
+    """
+    match = _match_expression(query)
+    if not match:
+        return []
+
+    weights = ", ".join(str(w) for w in FIELD_WEIGHTS.values())
+    sql = [
+        f"SELECT a.title, a.description, a.author, a.source, a.publishedAt, a.url, a.file, "
+        f"bm25(articles_fts, {weights}) AS score "
+        "FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+        "WHERE articles_fts MATCH ?"
+    ]
+    params = [match]
+    if source:
+        sql.append("AND a.source = ?")
+        params.append(source)
+    if author:
+        sql.append("AND a.author = ?")
+        params.append(author)
+    if since:
+        sql.append("AND a.publishedAt >= ?")
+        params.append(since)
+    if until:
+        sql.append("AND a.publishedAt <= ?")
+        params.append(until + "\uffff" if len(until) == 10 else until)
+    sql.append("ORDER BY score LIMIT ?")
+    params.append(limit)
+
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        # bm25() is lower-is-better; flip the sign so callers see higher-is-better
+        return [
+            dict(row, score=-row["score"])
+            for row in conn.execute(" ".join(sql), params)
+        ]
+    finally:
+        if own_conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the cleaned news corpus.")
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("--source")
+    parser.add_argument("--author")
+    parser.add_argument("--since", help="earliest publishedAt, e.g. 2025-10-01")
+    parser.add_argument("--until", help="latest publishedAt, e.g. 2025-10-15")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--reindex", action="store_true", help="index any cleaned files not yet indexed")
+    args = parser.parse_args()
+
+    if args.reindex:
+        print(f" Indexed {index_all_cleaned()} article(s) in total")
+    if args.query:
+        start = time.perf_counter()
+        results = search(args.query, args.source, args.author, args.since, args.until, args.limit)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for r in results:
+            print(f"{r['score']:7.2f}  {r['publishedAt'][:10]}  [{r['source']}]  {r['title']}")
+            if r["url"]:
+                print(f"         {r['url']}")
+        print(f" {len(results)} result(s) in {elapsed_ms:.1f} ms")
@@ -0,0 +1,154 @@
+# stats_store.py
+
+import os
+import re
+import json
+from datetime import datetime, timedelta, timezone
+from collections import Counter
+
+from postprocess import article_key, normalize_timestamp
+from storage import data_path
+
+# Relative to the data root, see storage.data_path
+STATS_FILE = os.path.join("stats", "stats_store.json")
+
+# Longest rolling window we answer queries for; older hour buckets are pruned.
+RETENTION_HOURS = 30 * 24
+WINDOWS = {"24h": 24, "7d": 7 * 24, "30d": 30 * 24}
+
+# Buckets are keyed by UTC hour, e.g. "2025-10-15T09"
+HOUR_FORMAT = "%Y-%m-%dT%H"
+
+TERM_RE = re.compile(r"[a-z][a-z0-9']+")
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been but by can could did do
+does for from had has have he her his how if in into is it its just more most
+new no not of on one or our out over said says she so some than that the their
+them then there these they this to up us was we were what when which who will
+with would you your
+""".split())
+
+
+def _utc_hour(now=None):
+    return (now or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime(HOUR_FORMAT)
+
+
+def _article_hour(article, fallback):
+    # normalize_timestamp yields UTC ISO, so the first 13 chars are the UTC hour
+    pub = normalize_timestamp(article.get("publishedAt") or "")
+    try:
+        return datetime.strptime(pub[:13], HOUR_FORMAT).strftime(HOUR_FORMAT)
+    except ValueError:
+        return fallback
+
+
+def extract_terms(text):
+    return [t for t in TERM_RE.findall(text.lower()) if len(t) > 2 and t not in STOPWORDS]
+
+
+class StatsStore:
+    """Per-hour article counts, source/author counts and term frequencies.
+
+    Each cleaned batch is folded into the UTC hour buckets it touches, so
+    the store never rescans old files. Buckets older than
+    ``retention_hours`` are dropped, which bounds both the file size and
+    the cost of a rolling-window query to at most ``retention_hours``
+    buckets no matter how much history has been ingested.
+    """
+
+    def __init__(self, path=None, retention_hours=RETENTION_HOURS):
+        self.path = path or data_path(STATS_FILE)
+        self.retention_hours = retention_hours
+        self.hours = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.hours = json.load(f).get("hours", {})
+
+    def update(self, articles, now=None):
+        """Fold a cleaned batch into the store. Returns the number of new articles."""
+        now = now or datetime.now(timezone.utc)
+        cutoff = self._cutoff(now)
+        added = 0
+        seen = {}
+        for a in articles:
+            hour = _article_hour(a, _utc_hour(now))
+            if hour < cutoff:
+                continue
+            bucket = self.hours.setdefault(
+                hour, {"articles": 0, "sources": {}, "authors": {}, "terms": {}, "keys": []}
+            )
+            # Overlapping fetch windows re-deliver the same article on later days
+            keys = seen.get(hour)
+            if keys is None:
+                keys = seen[hour] = set(bucket["keys"])
+            key = article_key(a)
+            if key in keys:
+                continue
+            keys.add(key)
+            bucket["keys"].append(key)
+            bucket["articles"] += 1
+
+            if a.get("source"):
+                bucket["sources"][a["source"]] = bucket["sources"].get(a["source"], 0) + 1
+            if a.get("author"):
+                bucket["authors"][a["author"]] = bucket["authors"].get(a["author"], 0) + 1
+            text = (a.get("title") or "") + " " + (a.get("description") or "")
+            for term in extract_terms(text):
+                bucket["terms"][term] = bucket["terms"].get(term, 0) + 1
+            added += 1
+
+        self.prune(now)
+        return added
+
+    def _cutoff(self, now):
+        return _utc_hour(now - timedelta(hours=self.retention_hours - 1))
+
+    def prune(self, now=None):
+        cutoff = self._cutoff(now or datetime.now(timezone.utc))
+        for hour in [h for h in self.hours if h < cutoff]:
+            del self.hours[hour]
+
+    def window(self, hours, now=None):
+        """Aggregate the last ``hours`` UTC hour buckets (the current hour inclusive)."""
+        if hours > self.retention_hours:
+            raise ValueError(f"window of {hours} hours exceeds retention of {self.retention_hours} hours")
+        now = now or datetime.now(timezone.utc)
+        totals = {"articles": 0, "sources": Counter(), "authors": Counter(), "terms": Counter()}
+        for offset in range(hours):
+            bucket = self.hours.get(_utc_hour(now - timedelta(hours=offset)))
+            if not bucket:
+                continue
+            totals["articles"] += bucket["articles"]
+            totals["sources"].update(bucket["sources"])
+            totals["authors"].update(bucket["authors"])
+            totals["terms"].update(bucket["terms"])
+        return totals
+
+    def top(self, field, hours, k=5, now=None):
+        return self.window(hours, now)[field].most_common(k)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"hours": self.hours}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def update_stats_store(articles, path=None):
+    store = StatsStore(path)
+    added = store.update(articles)
+    store.save()
+    print(f" Stats store updated: {added} new article(s) in {store.path}")
+    return store
+
+
+def format_rolling_stats(store, k=5, now=None):
+    lines = []
+    for label, hours in WINDOWS.items():
+        totals = store.window(hours, now)
+        lines.append(f"[{label}] Articles: {totals['articles']}")
+        lines.append(f"[{label}] Top Sources: {totals['sources'].most_common(k)}")
+        lines.append(f"[{label}] Top Authors: {totals['authors'].most_common(k)}")
+        lines.append(f"[{label}] Top Terms: {totals['terms'].most_common(k)}")
+    return "\n".join(lines)
@@ -0,0 +1,270 @@
+# storage.py
+
+import os
+import sys
+import json
+import shutil
+from datetime import date, datetime, timedelta
+
+from postprocess import article_key
+
+DATA_DIR = "data"
+MANIFEST_NAME = "manifest.json"
+# One-line pointer to the newest file, so "latest" never parses the manifest
+LATEST_NAME = "LATEST"
+SEGMENTS_DIR = "segments"
+
+# Partitions older than this are pruned by the scheduled pipeline.
+RAW_RETENTION_DAYS = 90
+CLEANED_RETENTION_DAYS = 365
+
+
+def set_data_dir(path):
+    """Point every data path (partitions, stats, search index, embeddings) at another root."""
+    global DATA_DIR
+    DATA_DIR = path
+
+
+def data_path(*parts):
+    """Resolve a path under the current data root."""
+    return os.path.join(DATA_DIR, *parts)
+
+
+def partition_root(kind):
+    return data_path(kind)
+
+
+def partition_dir(kind, day):
+    """Return data/<kind>/YYYY/MM/DD for the given date."""
+    return os.path.join(partition_root(kind), f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+
+
+def segment_path(kind, week_start):
+    """Return data/<kind>/segments/<kind>_YYYYWww.json for the ISO week starting on week_start."""
+    year, week, _ = week_start.isocalendar()
+    return os.path.join(partition_root(kind), SEGMENTS_DIR, f"{kind}_{year:04d}W{week:02d}.json")
+
+
+def manifest_path(kind):
+    return os.path.join(partition_root(kind), MANIFEST_NAME)
+
+
+def load_manifest(kind):
+    path = manifest_path(kind)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"partitions": {}}
+
+
+def save_manifest(kind, manifest):
+    path = manifest_path(kind)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _set_latest(kind, filename):
+    path = os.path.join(partition_root(kind), LATEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(filename if filename else "")
+    os.replace(tmp_path, path)
+
+
+def write_partitioned(kind, prefix, payload, now=None):
+    """Write payload into today's partition and register it in the manifest."""
+    now = now or datetime.now()
+    out_dir = partition_dir(kind, now.date())
+    os.makedirs(out_dir, exist_ok=True)
+    filename = os.path.join(out_dir, f"{prefix}_{now.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+    manifest = load_manifest(kind)
+    manifest["partitions"].setdefault(now.date().isoformat(), []).append(filename)
+    save_manifest(kind, manifest)
+    _set_latest(kind, filename)
+    return filename
+
+
+def get_latest_file(kind):
+    """Latest file written for kind, read from the LATEST pointer without listing directories.
+
+    This is always a single write (one fetch, one cleaning run), never a
+    weekly segment: None once that file has been compacted or pruned.
+    """
+    path = os.path.join(partition_root(kind), LATEST_NAME)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    return None
+
+
+def get_files_in_range(kind, start, end):
+    """Files registered for every day in [start, end], oldest first.
+
+    A weekly segment covers several days but is only listed once.
+    """
+    partitions = load_manifest(kind)["partitions"]
+    files = []
+    day = start
+    while day <= end:
+        for path in partitions.get(day.isoformat(), []):
+            if path not in files:
+                files.append(path)
+        day += timedelta(days=1)
+    return files
+
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _articles_of(data):
+    # Raw NewsAPI responses are `{"articles": [...]}`, cleaned files are plain lists
+    return data.get("articles", []) if isinstance(data, dict) else data
+
+
+def compact_partitions(kind, today=None, on_merge=None):
+    """Merge the daily files of each closed ISO week into one weekly segment.
+
+    Only weeks that ended before the current one are touched, so the
+    pipeline never writes into a week that is being compacted. Articles
+    re-delivered by overlapping fetches are only kept once per segment.
+    Segments keep the shape of their inputs: ``{"articles": [...]}`` for
+    raw responses, a plain list for cleaned files.
+
+    ``on_merge(old_paths, segment)`` is called before the merged files are
+    deleted, so anything that refers to them (the search index) can follow.
+    """
+    today = today or date.today()
+    current_week_start = today - timedelta(days=today.weekday())
+    manifest = load_manifest(kind)
+    partitions = manifest["partitions"]
+
+    weeks = {}
+    for day_str in partitions:
+        day = date.fromisoformat(day_str)
+        week_start = day - timedelta(days=day.weekday())
+        if week_start < current_week_start:
+            weeks.setdefault(week_start, []).append(day_str)
+
+    compacted = 0
+    latest = get_latest_file(kind)
+    for week_start, days in sorted(weeks.items()):
+        segment = segment_path(kind, week_start)
+        files = []
+        for day_str in sorted(days):
+            for path in partitions[day_str]:
+                if path not in files:
+                    files.append(path)
+        if files == [segment]:
+            continue
+
+        merged, seen, as_dict = [], set(), False
+        for path in files:
+            if not os.path.exists(path):
+                continue
+            data = _load_json(path)
+            as_dict = as_dict or isinstance(data, dict)
+            for article in _articles_of(data):
+                key = article_key(article)
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(article)
+
+        os.makedirs(os.path.dirname(segment), exist_ok=True)
+        tmp_path = segment + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"articles": merged} if as_dict else merged, f, ensure_ascii=False)
+        os.replace(tmp_path, segment)
+
+        for day_str in days:
+            partitions[day_str] = [segment]
+        # Write the manifest before deleting anything it used to point at
+        save_manifest(kind, manifest)
+        if on_merge:
+            on_merge([p for p in files if p != segment], segment)
+        if latest in files:
+            # A segment holds a whole week; callers such as run_cleaning_pipeline
+            # expect LATEST to be one fetch
+            _set_latest(kind, None)
+            latest = None
+        for path in files:
+            if path != segment and os.path.exists(path):
+                os.remove(path)
+                _remove_empty_dirs(os.path.dirname(path), partition_root(kind))
+        compacted += 1
+
+    print(f" Compacted {compacted} {kind} week(s) into segments")
+    return compacted
+
+
+def _remove_empty_dirs(path, stop):
+    while path != stop and os.path.isdir(path) and not os.listdir(path):
+        os.rmdir(path)
+        path = os.path.dirname(path)
+
+
+def apply_retention(kind, keep_days, today=None, on_remove=None):
+    """Delete day partitions older than keep_days and drop them from the manifest.
+
+    A weekly segment is deleted once none of the days it covers are kept.
+    ``on_remove(paths)`` is called with the files about to be deleted.
+    """
+    today = today or date.today()
+    cutoff = (today - timedelta(days=keep_days)).isoformat()
+    manifest = load_manifest(kind)
+    partitions = manifest["partitions"]
+    root = partition_root(kind)
+
+    expired = [d for d in partitions if d < cutoff]
+    still_used = {p for d, paths in partitions.items() if d >= cutoff for p in paths}
+    removed_files = set()
+    for day_str in expired:
+        for path in partitions.pop(day_str):
+            if path not in still_used:
+                removed_files.add(path)
+
+    save_manifest(kind, manifest)
+    if on_remove and removed_files:
+        on_remove(sorted(removed_files))
+    for path in removed_files:
+        if os.path.exists(path):
+            os.remove(path)
+        _remove_empty_dirs(os.path.dirname(path), root)
+    for day_str in expired:
+        # Drops summaries and profiles left in the day directory as well
+        day_dir = partition_dir(kind, date.fromisoformat(day_str))
+        if os.path.isdir(day_dir):
+            shutil.rmtree(day_dir)
+        _remove_empty_dirs(os.path.dirname(day_dir), root)
+
+    if get_latest_file(kind) in removed_files:
+        _set_latest(kind, None)
+    print(f" Pruned {len(expired)} {kind} partition(s) older than {cutoff}")
+    return len(expired)
+
+
+if __name__ == "__main__":
+    # Usage: python storage.py compact <kind>
+    #        python storage.py prune <kind> <keep_days>
+    if len(sys.argv) < 3 or sys.argv[1] not in ("compact", "prune"):
+        print("Usage: python storage.py compact <kind> | prune <kind> <keep_days>")
+        sys.exit(1)
+    kind = sys.argv[2]
+    on_merge = on_remove = None
+    if kind == "cleaned":
+        # Cleaned files are what the search index points at
+        from search_index import relocate_files, drop_files
+        on_merge, on_remove = relocate_files, drop_files
+    if sys.argv[1] == "compact":
+        compact_partitions(kind, on_merge=on_merge)
+    else:
+        default_days = CLEANED_RETENTION_DAYS if kind == "cleaned" else RAW_RETENTION_DAYS
+        apply_retention(kind, int(sys.argv[3]) if len(sys.argv) > 3 else default_days, on_remove=on_remove)
@@ -0,0 +1,34 @@
+# test_search_index.py
+
+import json
+
+import search_index
+
+
+def write(path, articles):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(articles, f)
+    return str(path)
+
+
+def test_recleaned_article_is_indexed_once(tmp_path):
+    url = "https://example.com/bitcoin-etf"
+    # The same article as cleaned by the LLM on two different days
+    first = write(tmp_path / "news_cleaned_1.json", [
+        {"title": "Bitcoin ETF approved", "content": "Regulators approved the fund.", "url": url},
+    ])
+    second = write(tmp_path / "news_cleaned_2.json", [
+        {"title": "Bitcoin ETF gets approval", "content": "The fund was approved by regulators.", "url": url},
+    ])
+
+    conn = search_index.connect(str(tmp_path / "index.sqlite3"))
+    try:
+        assert search_index.index_cleaned_file(first, conn) == 1
+        assert search_index.index_cleaned_file(second, conn) == 0
+        results = search_index.search("bitcoin approved", conn=conn)
+    finally:
+        conn.close()
+
+    assert len(results) == 1
+    assert results[0]["url"] == url
+    assert results[0]["file"] == second
@@ -0,0 +1,137 @@
+# test_storage.py
+
+import os
+import json
+from datetime import date, datetime
+
+import pytest
+
+import storage
+import search_index
+from storage import (
+    write_partitioned, compact_partitions, apply_retention, load_manifest, segment_path,
+)
+
+# Monday of ISO week 2025-W41, and a day in the following week
+WEEK_START = date(2025, 10, 6)
+NEXT_WEEK = date(2025, 10, 15)
+
+
+@pytest.fixture(autouse=True)
+def data_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def article(n):
+    return {
+        "title": f"Bitcoin story {n}", "description": "", "content": f"Body of story {n}",
+        "author": "", "source": "BBC News", "publishedAt": "", "url": f"https://example.com/{n}",
+    }
+
+
+def write_cleaned(day, articles):
+    return write_partitioned("cleaned", "news_cleaned", articles, now=datetime(day.year, day.month, day.day, 9))
+
+
+def test_search_index_follows_compaction():
+    first = write_cleaned(date(2025, 10, 6), [article(1), article(2)])
+    # Article 2 is re-delivered the next day
+    second = write_cleaned(date(2025, 10, 7), [article(2), article(3)])
+    search_index.index_cleaned_file(first)
+    search_index.index_cleaned_file(second)
+
+    compact_partitions("cleaned", today=NEXT_WEEK, on_merge=search_index.relocate_files)
+
+    segment = segment_path("cleaned", WEEK_START)
+    results = search_index.search("bitcoin")
+    assert len(results) == 3
+    assert {r["file"] for r in results} == {segment}
+
+    conn = search_index.connect()
+    try:
+        indexed = [row["path"] for row in conn.execute("SELECT path FROM indexed_files")]
+    finally:
+        conn.close()
+    assert indexed == [segment]
+
+
+def test_search_index_drops_pruned_articles():
+    old = write_cleaned(date(2025, 1, 6), [article(1), article(2)])
+    new = write_cleaned(date(2025, 10, 14), [article(2), article(3)])
+    search_index.index_cleaned_file(old)
+    search_index.index_cleaned_file(new)
+
+    apply_retention("cleaned", 30, today=NEXT_WEEK, on_remove=search_index.drop_files)
+
+    results = search_index.search("bitcoin")
+    # Article 2 is still in the retained file, article 1 is gone
+    assert sorted(r["title"] for r in results) == ["Bitcoin story 2", "Bitcoin story 3"]
+    assert {r["file"] for r in results} == {new}
+
+    conn = search_index.connect()
+    try:
+        # The FTS rows go with the articles, not just the metadata rows
+        assert conn.execute("SELECT count(*) FROM articles_fts").fetchone()[0] == 2
+        assert [row["path"] for row in conn.execute("SELECT path FROM indexed_files")] == [new]
+    finally:
+        conn.close()
+
+
+def test_latest_raw_is_cleared_when_its_fetch_is_compacted():
+    write_partitioned("raw", "raw_news", {"articles": [article(1)]}, now=datetime(2025, 10, 6, 9))
+    write_partitioned("raw", "raw_news", {"articles": [article(2)]}, now=datetime(2025, 10, 7, 9))
+
+    compact_partitions("raw", today=NEXT_WEEK)
+
+    # A standalone cleaning run must not pick up a whole week of articles
+    assert storage.get_latest_file("raw") is None
+
+
+def test_compaction_is_idempotent():
+    first = write_cleaned(date(2025, 10, 6), [article(1), article(2)])
+    second = write_cleaned(date(2025, 10, 8), [article(2), article(3)])
+
+    assert compact_partitions("cleaned", today=NEXT_WEEK) == 1
+    segment = segment_path("cleaned", WEEK_START)
+    with open(segment, "rb") as f:
+        merged = f.read()
+    manifest = load_manifest("cleaned")
+
+    assert compact_partitions("cleaned", today=NEXT_WEEK) == 0
+    with open(segment, "rb") as f:
+        assert f.read() == merged
+    assert load_manifest("cleaned") == manifest
+    assert manifest["partitions"] == {"2025-10-06": [segment], "2025-10-08": [segment]}
+    assert not os.path.exists(first) and not os.path.exists(second)
+    # Article 2 was delivered twice but is stored once
+    assert [a["url"] for a in json.loads(merged)] == [article(n)["url"] for n in (1, 2, 3)]
+
+
+def test_segment_is_kept_while_any_of_its_days_is_retained():
+    write_cleaned(date(2025, 10, 6), [article(1)])
+    write_cleaned(date(2025, 10, 10), [article(2)])
+    compact_partitions("cleaned", today=NEXT_WEEK)
+    segment = segment_path("cleaned", WEEK_START)
+
+    # Cutoff 2025-10-08: the 6th expires, the 10th is kept
+    apply_retention("cleaned", 7, today=NEXT_WEEK)
+    assert os.path.exists(segment)
+    assert load_manifest("cleaned")["partitions"] == {"2025-10-10": [segment]}
+
+    # Cutoff 2025-10-13: the whole week has expired
+    apply_retention("cleaned", 2, today=NEXT_WEEK)
+    assert not os.path.exists(segment)
+    assert load_manifest("cleaned")["partitions"] == {}
+
+
+def test_latest_is_cleared_when_retention_prunes_everything():
+    write_cleaned(date(2025, 10, 6), [article(1)])
+    latest = write_cleaned(date(2025, 10, 7), [article(2)])
+    assert storage.get_latest_file("cleaned") == latest
+
+    apply_retention("cleaned", 1, today=NEXT_WEEK)
+
+    assert storage.get_latest_file("cleaned") is None
+    assert not os.path.exists(latest)
+    assert load_manifest("cleaned")["partitions"] == {}